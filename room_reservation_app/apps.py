@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RoomReservationAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'room_reservation_app'
+
+    def ready(self):
+        from room_reservation_app import signals  # noqa: F401
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from room_reservation_app.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized room occupancy bitmaps from all reservations.'
+
+    def handle(self, *args, **options):
+        count = rebuild_occupancy()
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} room occupancy bitmaps.'))
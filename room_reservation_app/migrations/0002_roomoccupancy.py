@@ -0,0 +1,27 @@
+# Generated by Django 3.2.4 on 2026-10-18 22:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room_reservation_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bitmap', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to='room_reservation_app.room')),
+            ],
+            options={
+                'ordering': ['room', 'date'],
+                'unique_together': {('room', 'date')},
+            },
+        ),
+    ]
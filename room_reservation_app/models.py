@@ -30,3 +30,22 @@ class Reservation(models.Model):
 
     def __str__(self):
         return ", ".join([self.title, str(self.reserved_from.date())])
+
+
+class RoomOccupancy(models.Model):
+    """Model, representing materialized room occupancy of a single day.
+
+    Day is split into fixed length slots (see `room_reservation_app.occupancy`), bitmap stores one bit per slot, first
+    slot being the most significant bit of the first byte. Rows are kept up to date by Reservation signals.
+    """
+
+    room = models.ForeignKey(Room, related_name='occupancies', on_delete=models.CASCADE)
+    date = models.DateField()
+    bitmap = models.BinaryField()
+
+    class Meta:
+        ordering = ['room', 'date']
+        unique_together = ['room', 'date']
+
+    def __str__(self):
+        return ", ".join([str(self.room), str(self.date)])
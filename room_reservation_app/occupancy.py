@@ -0,0 +1,147 @@
+"""Materialized room occupancy.
+
+Every day (in `settings.TIME_ZONE`) is split into `SLOTS_PER_DAY` slots of `SLOT_MINUTES` minutes. Occupancy of a room
+during a day is stored as a bitmap in `RoomOccupancy`, one bit per slot, most significant bit of the first byte being
+the first slot of the day. Slot is marked as occupied if any reservation overlaps it.
+"""
+import base64
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from room_reservation_app.models import Reservation, Room, RoomOccupancy
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_SIZE = SLOTS_PER_DAY // 8
+
+_SLOT = timedelta(minutes=SLOT_MINUTES)
+_EPSILON = timedelta(microseconds=1)
+_FULL_DAY = b'\xff' * BITMAP_SIZE
+
+
+def _iter_slots(time_from: datetime, time_to: datetime) -> Iterator[Tuple[date, int]]:
+    """Yield (local date, slot index) of every slot starting at or before `time_to` and ending after `time_from`.
+
+    Slots are walked in absolute time, so days with DST transitions map their repeated hour onto the same slots.
+    """
+    seconds = SLOT_MINUTES * 60
+    current = datetime.fromtimestamp(time_from.timestamp() // seconds * seconds, tz=timezone.utc)
+    while current <= time_to:
+        local = timezone.localtime(current)
+        yield local.date(), (local.hour * 60 + local.minute) // SLOT_MINUTES
+        current += _SLOT
+
+
+def build_bitmaps(periods: Iterable[Tuple[int, datetime, datetime]], first_day: Optional[date] = None,
+                  last_day: Optional[date] = None) -> Dict[Tuple[int, date], bytearray]:
+    """Return bitmaps of occupied (room id, date) pairs for given (room id, reserved from, reserved to) periods.
+
+    Reservation end time is exclusive, but at least one slot is always occupied. If `first_day` or `last_day` is given,
+    bitmaps of days outside of them are not built. Slots are only walked for the first and the last day of reservation,
+    days in between are fully occupied.
+    """
+    bitmaps = {}
+
+    def mark(room_id: int, time_from: datetime, time_to: datetime) -> None:
+        for day, slot in _iter_slots(time_from, time_to):
+            bitmap = bitmaps.setdefault((room_id, day), bytearray(BITMAP_SIZE))
+            bitmap[slot // 8] |= 0x80 >> (slot % 8)
+
+    for room_id, time_from, time_to in periods:
+        time_to = max(time_from, time_to - _EPSILON)
+        start_day, end_day = timezone.localdate(time_from), timezone.localdate(time_to)
+        if first_day and start_day < first_day:
+            time_from, start_day = day_start(first_day), first_day
+        if last_day and end_day > last_day:
+            time_to, end_day = day_start(last_day + timedelta(days=1)) - _EPSILON, last_day
+        if start_day > end_day:
+            continue
+        if start_day == end_day:
+            mark(room_id, time_from, time_to)
+            continue
+        mark(room_id, time_from, day_start(start_day + timedelta(days=1)) - _EPSILON)
+        mark(room_id, day_start(end_day), time_to)
+        for offset in range(1, (end_day - start_day).days):
+            bitmaps[room_id, start_day + timedelta(days=offset)] = bytearray(_FULL_DAY)
+    return bitmaps
+
+
+def reservation_days(time_from: datetime, time_to: datetime) -> Tuple[date, date]:
+    """Return first and last local day occupied by reservation."""
+    return timezone.localdate(time_from), timezone.localdate(max(time_from, time_to - _EPSILON))
+
+
+def day_start(day: date) -> datetime:
+    """Return aware datetime of local midnight of given day."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def refresh_room_days(room_id: int, first_day: date, last_day: date) -> None:
+    """Recalculate stored occupancy of single room from `first_day` to `last_day` inclusive.
+
+    Room row is locked first, so that concurrent refreshes of the same room are serialized and the last one always sees
+    all committed reservations.
+    """
+    with transaction.atomic():
+        list(Room.objects.select_for_update().filter(id=room_id).values_list('id'))
+        periods = Reservation.objects.filter(
+            room_id=room_id,
+            reserved_from__lt=day_start(last_day + timedelta(days=1)),
+            reserved_to__gte=day_start(first_day),
+        ).values_list('room_id', 'reserved_from', 'reserved_to')
+        bitmaps = build_bitmaps(periods, first_day, last_day)
+        RoomOccupancy.objects.filter(room_id=room_id, date__range=(first_day, last_day)).delete()
+        RoomOccupancy.objects.bulk_create(
+            RoomOccupancy(room_id=room_id, date=day, bitmap=bytes(bitmap)) for (_, day), bitmap in bitmaps.items()
+        )
+
+
+def refresh_reservation(room_id: int, time_from: datetime, time_to: datetime) -> None:
+    """Recalculate stored occupancy of days touched by reservation period."""
+    refresh_room_days(room_id, *reservation_days(time_from, time_to))
+
+
+def rebuild_occupancy() -> int:
+    """Recalculate stored occupancy of all rooms from scratch, one room at a time. Return number of stored bitmaps.
+
+    All rooms are locked for the whole rebuild, so that refreshes triggered by concurrent reservation changes wait for
+    it to finish.
+    """
+    count = 0
+    with transaction.atomic():
+        room_ids = list(Room.objects.select_for_update().order_by('id').values_list('id', flat=True))
+        RoomOccupancy.objects.all().delete()
+        for room_id in room_ids:
+            periods = Reservation.objects.filter(room_id=room_id).values_list('room_id', 'reserved_from', 'reserved_to')
+            bitmaps = build_bitmaps(periods.iterator())
+            RoomOccupancy.objects.bulk_create(
+                RoomOccupancy(room_id=room_id, date=day, bitmap=bytes(bitmap)) for (_, day), bitmap in bitmaps.items()
+            )
+            count += len(bitmaps)
+    return count
+
+
+def pack_occupancy(bitmaps: List[Optional[bytes]], slot_minutes: int = SLOT_MINUTES) -> str:
+    """Return base64 encoded concatenation of consecutive day bitmaps, missing days being unoccupied.
+
+    If `slot_minutes` is a multiple of `SLOT_MINUTES`, slots are merged, merged slot being occupied if any of its slots
+    is. Bits of all days are concatenated without padding, only the last byte is padded with zeros.
+    """
+    if slot_minutes == SLOT_MINUTES:
+        packed = b''.join(bytes(bitmap) if bitmap else bytes(BITMAP_SIZE) for bitmap in bitmaps)
+        return base64.b64encode(packed).decode()
+    factor = slot_minutes // SLOT_MINUTES
+    bits = []
+    for bitmap in bitmaps:
+        value = int.from_bytes(bitmap, 'big') if bitmap else 0
+        for start in range(0, SLOTS_PER_DAY, factor):
+            mask = ((1 << factor) - 1) << (SLOTS_PER_DAY - start - factor)
+            bits.append(bool(value & mask))
+    packed = bytearray((len(bits) + 7) // 8)
+    for index, bit in enumerate(bits):
+        if bit:
+            packed[index // 8] |= 0x80 >> (index % 8)
+    return base64.b64encode(bytes(packed)).decode()
@@ -0,0 +1,75 @@
+from datetime import datetime
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from room_reservation_app.models import Reservation
+from room_reservation_app.occupancy import refresh_reservation
+
+PERIOD_FIELDS = ('room_id', 'reserved_from', 'reserved_to')
+
+
+def get_period(instance: Reservation):
+    """Return (room id, reserved from, reserved to) of reservation, None if any of them is not loaded."""
+    if not all(field in instance.__dict__ for field in PERIOD_FIELDS):
+        return None
+    return tuple(instance.__dict__[field] for field in PERIOD_FIELDS)
+
+
+def to_aware_datetime(value) -> datetime:
+    """Return value converted the same way `DateTimeField` does before saving it - parsed and made aware."""
+    value = Reservation._meta.get_field('reserved_from').to_python(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    return value
+
+
+def normalize_period(period):
+    """Return period with datetimes as they are stored in database."""
+    room_id, time_from, time_to = period
+    return room_id, to_aware_datetime(time_from), to_aware_datetime(time_to)
+
+
+@receiver(post_init, sender=Reservation)
+def remember_reservation_period(sender, instance: Reservation, **kwargs):
+    """Remember period of stored reservation, so that occupancy of days it no longer covers is released on update."""
+    instance._stored_period = get_period(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Reservation)
+def update_occupancy_on_save(sender, instance: Reservation, created: bool, raw: bool, **kwargs):
+    """Recalculate occupancy of days touched by saved reservation once saving transaction is committed.
+
+    Fixtures are loaded raw, `rebuild_room_occupancy` has to be run after loading them.
+    """
+    if raw:
+        return
+    stored_period = getattr(instance, '_stored_period', None)
+    if get_period(instance) is None:
+        # Some period fields were deferred, load them to know which days to recalculate.
+        instance.refresh_from_db(fields=['room', 'reserved_from', 'reserved_to'])
+    current_period = normalize_period(get_period(instance))
+    instance._stored_period = current_period
+    if stored_period:
+        stored_period = normalize_period(stored_period)
+        if not created and stored_period == current_period:
+            return
+        if stored_period != current_period:
+            transaction.on_commit(partial(refresh_reservation, *stored_period))
+    transaction.on_commit(partial(refresh_reservation, *current_period))
+
+
+@receiver(pre_delete, sender=Reservation)
+def load_reservation_period(sender, instance: Reservation, **kwargs):
+    """Load deferred period fields while reservation still exists, they are needed once it is deleted."""
+    if get_period(instance) is None:
+        instance.refresh_from_db(fields=['room', 'reserved_from', 'reserved_to'])
+
+
+@receiver(post_delete, sender=Reservation)
+def update_occupancy_on_delete(sender, instance: Reservation, **kwargs):
+    """Recalculate occupancy of days touched by deleted reservation once deleting transaction is committed."""
+    transaction.on_commit(partial(refresh_reservation, *normalize_period(get_period(instance))))
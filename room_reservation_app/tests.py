@@ -1,12 +1,16 @@
+import base64
+import io
+import warnings
 from datetime import datetime, timedelta
 
 import pytz
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APIClient
 
-from room_reservation_app.models import Room, Reservation
+from room_reservation_app.models import Room, Reservation, RoomOccupancy
 from room_reservation_app.views import check_room_availability
 
 
@@ -251,3 +255,221 @@ class ReservationTest(TestCase):
             self.current_time,
             self.current_time + timedelta(hours=1.5))
         self.assertEquals(error_response, None)
+
+
+class OccupancyTest(TransactionTestCase):
+    """Tests for functionality related to materialized room occupancy.
+
+    Occupancy is refreshed once reservation changes are committed, hence transactions are not wrapped around tests.
+    """
+
+    occupancy_url = '/api/rooms/occupancy/'
+
+    def setUp(self):
+        # Initialize client.
+        self.client = APIClient()
+
+        # Room Instances.
+        self.room1 = Room.objects.create(title='Room 1')
+        self.room2 = Room.objects.create(title='Room 2')
+
+        # User Instances.
+        self.user1 = User.objects.create_user(username='testuser1', password='12345')
+
+        # Reservation Instances - 09:00-10:00 and 23:30-00:30 of the following day.
+        self.day = datetime(2021, 6, 21).date()
+        self.morning = pytz.timezone(settings.TIME_ZONE).localize(datetime(2021, 6, 21, 9))
+        self.reservation1 = Reservation.objects.create(
+            title="Daily Stand-up",
+            room=self.room1,
+            reserved_from=self.morning,
+            reserved_to=self.morning + timedelta(hours=1),
+            owner=self.user1,
+        )
+        self.reservation2 = Reservation.objects.create(
+            title="Release",
+            room=self.room1,
+            reserved_from=self.morning + timedelta(hours=14, minutes=30),
+            reserved_to=self.morning + timedelta(hours=15, minutes=30),
+            owner=self.user1,
+        )
+
+    def get_occupied_slots(self, room, day):
+        """Return indexes of occupied slots stored for room during day."""
+        bitmap = RoomOccupancy.objects.get(room=room, date=day).bitmap
+        return [slot for slot in range(96) if bitmap[slot // 8] & (0x80 >> (slot % 8))]
+
+    def test_occupancy_on_create(self):
+        """Test if occupancy is stored for every day touched by reservations."""
+        self.assertEquals(self.get_occupied_slots(self.room1, self.day), [36, 37, 38, 39, 94, 95])
+        self.assertEquals(self.get_occupied_slots(self.room1, self.day + timedelta(days=1)), [0, 1])
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room2), 'Room2 has no reservations.')
+
+    def test_occupancy_on_update(self):
+        """Test if occupancy of previous period and room is released after reservation is moved."""
+        # Do.
+        self.reservation2.room = self.room2
+        self.reservation2.reserved_from = self.morning + timedelta(hours=1)
+        self.reservation2.reserved_to = self.morning + timedelta(hours=1, minutes=10)
+        self.reservation2.save()
+        # Check.
+        self.assertEquals(self.get_occupied_slots(self.room1, self.day), [36, 37, 38, 39])
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room1, date=self.day + timedelta(days=1)))
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day), [40])
+
+    def test_occupancy_on_delete(self):
+        """Test if occupancy is released after reservation is deleted."""
+        # Do.
+        self.reservation1.delete()
+        self.reservation2.delete()
+        # Check.
+        self.assertFalse(RoomOccupancy.objects.exists(), 'No occupancy should be left without reservations.')
+
+    def test_rebuild_occupancy_command(self):
+        """Test if management command restores occupancy from reservations."""
+        # Setup - bulk update bypasses signals.
+        Reservation.objects.filter(id=self.reservation2.id).update(room=self.room2)
+        stdout = io.StringIO()
+        # Do.
+        call_command('rebuild_room_occupancy', stdout=stdout)
+        # Check.
+        self.assertIn('Stored 3 room occupancy bitmaps.', stdout.getvalue())
+        self.assertEquals(self.get_occupied_slots(self.room1, self.day), [36, 37, 38, 39])
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day), [94, 95])
+        self.assertEquals(RoomOccupancy.objects.count(), 3)
+
+    def test_occupancy_on_dst_change(self):
+        """Test if occupancy is stored correctly for reservations around a day with DST change (25 hours long)."""
+        # Setup - 2021-10-31 clocks go back from 04:00 to 03:00.
+        day = datetime(2021, 10, 31).date()
+        local_timezone = pytz.timezone(settings.TIME_ZONE)
+        # Do.
+        for reserved_from, reserved_to in [(datetime(2021, 10, 30, 23, 30), datetime(2021, 10, 31, 0, 30)),
+                                           (datetime(2021, 10, 31, 23, 30), datetime(2021, 11, 1, 0, 30))]:
+            Reservation.objects.create(
+                title="Night Shift",
+                room=self.room2,
+                reserved_from=local_timezone.localize(reserved_from),
+                reserved_to=local_timezone.localize(reserved_to),
+                owner=self.user1,
+            )
+        Reservation.objects.create(
+            title="Maintenance",
+            room=self.room1,
+            reserved_from=local_timezone.localize(datetime(2021, 10, 31)),
+            reserved_to=local_timezone.localize(datetime(2021, 11, 1)),
+            owner=self.user1,
+        )
+        # Check.
+        self.assertEquals(self.get_occupied_slots(self.room2, day - timedelta(days=1)), [94, 95])
+        self.assertEquals(self.get_occupied_slots(self.room2, day), [0, 1, 94, 95])
+        self.assertEquals(self.get_occupied_slots(self.room2, day + timedelta(days=1)), [0, 1])
+        self.assertEquals(self.get_occupied_slots(self.room1, day), list(range(96)), 'Whole day should be occupied.')
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room1, date=day + timedelta(days=1)))
+
+    def test_occupancy_naive_and_string_datetimes(self):
+        """Test if reservations with naive datetimes or ISO strings are saved with occupancy, as Django accepts them."""
+        # Do.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            Reservation.objects.create(
+                title="Lunch",
+                room=self.room2,
+                reserved_from=datetime(2021, 6, 21, 12),
+                reserved_to=datetime(2021, 6, 21, 12, 30),
+                owner=self.user1,
+            )
+        Reservation.objects.create(
+            title="Demo",
+            room=self.room2,
+            reserved_from='2021-06-21T16:00:00+03:00',
+            reserved_to='2021-06-21T16:15:00+03:00',
+            owner=self.user1,
+        )
+        # Check - naive datetimes are interpreted in default time zone.
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day), [48, 49, 64])
+
+    def test_occupancy_long_reservation(self):
+        """Test if days between first and last day of long reservation are fully occupied."""
+        # Do.
+        Reservation.objects.create(
+            title="Renovation",
+            room=self.room2,
+            reserved_from=self.morning,
+            reserved_to=self.morning + timedelta(days=3650),
+            owner=self.user1,
+        )
+        # Check.
+        self.assertEquals(RoomOccupancy.objects.filter(room=self.room2).count(), 3651)
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day), list(range(36, 96)))
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day + timedelta(days=100)), list(range(96)))
+        self.assertEquals(self.get_occupied_slots(self.room2, self.day + timedelta(days=3650)), list(range(36)))
+
+    def test_check_room_availability_too_long(self):
+        """Test if reservations longer than allowed maximum are rejected."""
+        # Do.
+        error_response = check_room_availability(
+            self.room2, self.morning.isoformat(), (self.morning + timedelta(days=367)).isoformat())
+        # Check.
+        self.assertEquals(error_response.data, 'Reservation cannot be longer than 366 days!')
+        self.assertEquals(check_room_availability(self.room2, self.morning, self.morning + timedelta(days=366)), None)
+
+    def test_occupancy_not_refreshed_without_period_change(self):
+        """Test if saving reservation without changing its period does not recalculate occupancy."""
+        # Setup.
+        self.reservation1.title = 'Weekly Stand-up'
+        # Do / Check - only reservation itself is updated.
+        with self.assertNumQueries(1):
+            self.reservation1.save()
+
+    def test_occupancy_not_refreshed_on_raw_save(self):
+        """Test if raw saves, used for loading fixtures, do not recalculate occupancy."""
+        # Setup.
+        self.reservation1.room = self.room2
+        # Do.
+        self.reservation1.save_base(raw=True)
+        # Check.
+        self.assertEquals(self.get_occupied_slots(self.room1, self.day), [36, 37, 38, 39, 94, 95])
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room2))
+
+    def test_room_availability_with_stale_occupancy(self):
+        """Test if reservations, not stored occupancy, decide room availability."""
+        # Setup - bulk update bypasses signals, so room2 occupancy stays empty.
+        Reservation.objects.filter(id=self.reservation1.id).update(room=self.room2)
+        self.assertFalse(RoomOccupancy.objects.filter(room=self.room2))
+        # Do.
+        error_response = check_room_availability(
+            self.room2, self.morning + timedelta(minutes=30), self.morning + timedelta(hours=2))
+        # Check.
+        self.assertEquals(error_response.data, 'Selected room is occupied during requested period!')
+
+    def test_get_occupancy(self):
+        """Test room occupancy endpoint."""
+        # Do.
+        response = self.client.get(
+            f"{self.occupancy_url}?from={self.day}&to={self.day + timedelta(days=1)}&slot=15m", format='json')
+        # Check.
+        self.assertEquals(response.status_code, 200, 'Get should return 200 status code.')
+        response_json = response.json()
+        self.assertEquals(response_json.get('slots_per_day'), 96)
+        occupancy = {room['room']: base64.b64decode(room['occupancy']) for room in response_json.get('rooms')}
+        self.assertEquals(occupancy[self.room2.id], bytes(24), 'Room2 should be free during both days.')
+        self.assertEquals(occupancy[self.room1.id][4], 0x0f, 'Room1 should be occupied from 09:00 to 10:00.')
+        self.assertEquals(occupancy[self.room1.id][11], 0x03, 'Room1 should be occupied from 23:30.')
+        self.assertEquals(occupancy[self.room1.id][12], 0xc0, 'Room1 should be occupied until 00:30.')
+
+    def test_get_occupancy_merged_slots(self):
+        """Test room occupancy endpoint with longer slots."""
+        # Do.
+        response = self.client.get(f"{self.occupancy_url}?from={self.day}&to={self.day}&slot=1h", format='json')
+        # Check.
+        self.assertEquals(response.status_code, 200, 'Get should return 200 status code.')
+        occupancy = {room['room']: base64.b64decode(room['occupancy']) for room in response.json().get('rooms')}
+        self.assertEquals(occupancy[self.room1.id], bytes([0x00, 0x40, 0x01]), 'Hours 9 and 23 should be occupied.')
+
+    def test_get_occupancy_invalid_parameters(self):
+        """Test room occupancy endpoint with invalid parameters."""
+        for query in ['from=2021-06-21&to=2021-06-20', 'from=2021-06-01&to=2021-07-31', 'slot=20m', 'from=21-06',
+                      'from=9999-12-30']:
+            response = self.client.get(f"{self.occupancy_url}?{query}", format='json')
+            self.assertEquals(response.status_code, 400, f'Get with "{query}" should return 400 status code.')
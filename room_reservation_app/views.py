@@ -1,20 +1,66 @@
-from datetime import datetime
+import re
+from datetime import datetime, timedelta
 from typing import Optional
 
 from django.contrib.auth.models import User
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from room_reservation_app.models import Reservation, Room
+from room_reservation_app.models import Reservation, Room, RoomOccupancy
+from room_reservation_app.occupancy import SLOT_MINUTES, SLOTS_PER_DAY, pack_occupancy
 from room_reservation_app.serializers import ReservationSerializer, RoomSerializer
 
+MAX_OCCUPANCY_DAYS = 31
+MAX_RESERVATION_DAYS = 366
+
 
 class RoomViewSet(viewsets.ReadOnlyModelViewSet):
     """This viewset automatically provides list, create, retrieve, update and destroy actions."""
     serializer_class = RoomSerializer
     queryset = Room.objects.all()
 
+    @action(detail=False)
+    def occupancy(self, request, *args, **kwargs):
+        """Return packed occupancy bitmaps of all rooms for requested period."""
+        params = request.query_params
+        try:
+            date_from = parse_date(params['from']) if 'from' in params else timezone.localdate()
+            date_to = parse_date(params['to']) if 'to' in params else date_from and date_from + timedelta(days=6)
+        except (ValueError, OverflowError):
+            date_from = date_to = None
+        if not date_from or not date_to:
+            return Response("Period dates must be given in YYYY-MM-DD format!", status=status.HTTP_400_BAD_REQUEST)
+        if date_from > date_to:
+            return Response("Period start date cannot be later than its end date!", status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days >= MAX_OCCUPANCY_DAYS:
+            return Response(f"Period cannot be longer than {MAX_OCCUPANCY_DAYS} days!",
+                            status=status.HTTP_400_BAD_REQUEST)
+        slot_minutes = parse_slot_minutes(params.get('slot', f'{SLOT_MINUTES}m'))
+        if not slot_minutes:
+            return Response(f"Slot must be a multiple of {SLOT_MINUTES} minutes dividing a day, e.g. '30m' or '1h'!",
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rooms = self.get_queryset()
+        bitmaps = {
+            (room_id, day): bitmap for room_id, day, bitmap in RoomOccupancy.objects.filter(
+                room__in=rooms, date__range=(date_from, date_to)).values_list('room_id', 'date', 'bitmap')
+        }
+        days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        return Response({
+            'from': date_from,
+            'to': date_to,
+            'slot': slot_minutes,
+            'slots_per_day': SLOTS_PER_DAY * SLOT_MINUTES // slot_minutes,
+            'rooms': [{
+                'room': room.id,
+                'occupancy': pack_occupancy([bitmaps.get((room.id, day)) for day in days], slot_minutes),
+            } for room in rooms],
+        })
+
 
 class ReservationViewSet(viewsets.ModelViewSet):
     """This viewset automatically provides list, create, retrieve, update and destroy actions."""
@@ -66,6 +112,10 @@ def check_room_availability(room: Room, time_from: datetime, time_to: datetime,
 
     if time_from > time_to:
         return Response("Reservation start time cannot be later than its end time!", status=status.HTTP_400_BAD_REQUEST)
+    duration = get_duration(time_from, time_to)
+    if duration and duration > timedelta(days=MAX_RESERVATION_DAYS):
+        return Response(f"Reservation cannot be longer than {MAX_RESERVATION_DAYS} days!",
+                        status=status.HTTP_400_BAD_REQUEST)
     if not is_room_available(room, time_from, time_to, reservation):
         return Response("Selected room is occupied during requested period!", status=status.HTTP_400_BAD_REQUEST)
 
@@ -85,7 +135,28 @@ def is_room_available(
     return True
 
 
+def get_duration(time_from, time_to) -> Optional[timedelta]:
+    """Return duration between datetimes or ISO formatted strings, None if it cannot be calculated."""
+    try:
+        time_from = parse_datetime(time_from) if isinstance(time_from, str) else time_from
+        time_to = parse_datetime(time_to) if isinstance(time_to, str) else time_to
+        return time_to - time_from
+    except (ValueError, TypeError):
+        return None
+
+
 def check_reservation_ownership(user: User, reservation: Reservation) -> Optional[Response]:
     """Return detailed error Response if reservation is not owned by user making the request."""
     if reservation.owner != user:
         return Response("Only reservation owner can delete it!", status=status.HTTP_403_FORBIDDEN)
+
+
+def parse_slot_minutes(slot: str) -> Optional[int]:
+    """Return slot length in minutes from strings like '15m' or '1h', None if slot is not supported."""
+    match = re.fullmatch(r'(\d+)([mh])', slot)
+    if not match:
+        return None
+    minutes = int(match.group(1)) * (60 if match.group(2) == 'h' else 1)
+    if not minutes or minutes % SLOT_MINUTES or SLOTS_PER_DAY * SLOT_MINUTES % minutes:
+        return None
+    return minutes